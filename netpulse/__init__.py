@@ -2,3 +2,6 @@ from .core_ping import tcp_ping as tcp_ping
 from .core_http import perform_http_request as perform_http_request
 from .core_security import get_security_info as get_security_info
 from .core_load import run_load_test as run_load_test
+from .core_agent import run_distributed_load_test as run_distributed_load_test
+from .core_metrics import MetricsRegistry as MetricsRegistry
+from .core_metrics import start_metrics_server as start_metrics_server
@@ -1,23 +1,52 @@
 import json
+import time
 import typer
 from typing import Optional, Dict, Any
 from netpulse.core_ping import tcp_ping
 from netpulse.core_http import perform_http_request
 from netpulse.core_security import get_security_info
 from netpulse.core_load import run_load_test
+from netpulse.core_agent import run_agent, run_distributed_load_test
+from netpulse.core_metrics import MetricsRegistry, start_metrics_server
 from netpulse.logger import log_json
 
 main = typer.Typer(help="NetPulse CLI - Network & API testing tool")
 
 
+def _metrics_registry(metrics_port: Optional[int]) -> Optional[MetricsRegistry]:
+    if metrics_port is None:
+        return None
+    registry = MetricsRegistry()
+    start_metrics_server(registry, metrics_port)
+    return registry
+
+
 # -------------------- PING --------------------
 @main.command()
-def ping(host: str, port: Optional[int] = 443, path: Optional[str] = None):
-
-    result = tcp_ping(host, port)
-    print(json.dumps(result, indent=4))
-    if path:
-        log_json(result, path)
+def ping(
+    host: str,
+    port: Optional[int] = 443,
+    path: Optional[str] = None,
+    interval: Optional[float] = None,
+    metrics_port: Optional[int] = None,
+):
+    """Ping once, or every --interval seconds until interrupted"""
+    if metrics_port is not None and interval is None:
+        raise typer.BadParameter(
+            "--metrics-port needs --interval; a single ping exits before a scrape."
+        )
+    metrics = _metrics_registry(metrics_port)
+
+    while True:
+        result = tcp_ping(host, port)
+        if metrics is not None:
+            metrics.observe_ping(result)
+        print(json.dumps(result, indent=4))
+        if path:
+            log_json(result, path)
+        if interval is None:
+            break
+        time.sleep(interval)
 
 
 # -------------------- HTTP --------------------
@@ -76,23 +105,65 @@ def load(
     login_P: Optional[str] = "/api/v1/login",
     register_P: Optional[str] = "/api/v1/register",
     path: Optional[str] = None,
+    agents: Optional[str] = None,
+    agent_token: Optional[str] = typer.Option(None, envvar="NETPULSE_AGENT_TOKEN"),
+    warmup_seconds: float = 0.0,
+    warmup_requests: int = typer.Option(
+        0, help="Warm-up request count; at least one per user is always sent."
+    ),
+    warmup_endpoint: Optional[str] = typer.Option(
+        None, help="Path for the unauthenticated warm-up GETs; defaults to the target."
+    ),
+    metrics_port: Optional[int] = None,
 ):
     """Run load test with multiple simulated users"""
+    if agents and not agent_token:
+        raise typer.BadParameter(
+            "--agents needs --agent-token (or NETPULSE_AGENT_TOKEN) to match the "
+            "agents' --token."
+        )
+    if agents and metrics_port is not None:
+        raise typer.BadParameter(
+            "--metrics-port is not used with --agents; "
+            "pass it to each `netpulse agent` instead."
+        )
     payload_data: Optional[dict] = json.loads(payload) if payload else None
-    result = run_load_test(
-        base_url=url,
-        target_endpoint=target,
-        http_method=method,
-        login_endpoint="/api/v1/login",
-        num_new_users=users,
-        start_user_id=start,
-        auth_token_format="",
-        delay_ms=delay,
-        target_payload=payload_data,
-    )
+    load_args = {
+        "base_url": url,
+        "target_endpoint": target,
+        "http_method": method,
+        "login_endpoint": "/api/v1/login",
+        "num_new_users": users,
+        "start_user_id": int(start),
+        "auth_token_format": "",
+        "delay_ms": delay,
+        "target_payload": payload_data,
+        "warmup_seconds": warmup_seconds,
+        "warmup_requests": warmup_requests,
+        "warmup_endpoint": warmup_endpoint,
+    }
+    if agents:
+        # Spread the users over remote `netpulse agent` processes.
+        result = run_distributed_load_test(
+            agents.split(","), **load_args, token=agent_token
+        )
+    else:
+        result = run_load_test(**load_args, metrics=_metrics_registry(metrics_port))
     print(json.dumps(result, indent=4))
     if path:
-        log_json(path)
+        log_json(result, path)
+
+
+# -------------------- AGENT --------------------
+@main.command()
+def agent(
+    token: str = typer.Option(..., envvar="NETPULSE_AGENT_TOKEN"),
+    host: str = "127.0.0.1",
+    port: int = 7070,
+    metrics_port: Optional[int] = None,
+):
+    """Listen for a `netpulse load --agents` controller and generate load for it"""
+    run_agent(token, host, port, _metrics_registry(metrics_port))
 
 
 # -------------------- MAIN --------------------
@@ -0,0 +1,672 @@
+import hmac
+import json
+import socket
+import socketserver
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from netpulse.core_load import logger, run_load_test
+from netpulse.core_metrics import LATENCY_BUCKETS_MS, MetricsRegistry
+
+# Wire protocol: newline-delimited JSON messages over a single TCP connection.
+#   controller -> agent: {"type": "configure", "token": "...", "test": {...}}
+#   agent -> controller: {"type": "ready"} or {"type": "error", "error": "..."}
+#   controller -> agent: {"type": "start", "interval_s": 1.0}
+#   agent -> controller: {"type": "interval", "seq": n, "aggregate": {...}}  (repeated)
+#   agent -> controller: {"type": "done", ...} or {"type": "error", "error": "..."}
+
+
+def _new_aggregate() -> Dict[str, Any]:
+    return {
+        "total": 0,
+        "successful": 0,
+        "failed": 0,
+        "latency_sum_ms": 0.0,
+        "latency_min_ms": None,
+        "latency_max_ms": None,
+        "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        "steps": {},
+    }
+
+
+def _record_into(aggregate: Dict[str, Any], record: Dict[str, Any]):
+
+    aggregate["total"] += 1
+    step = aggregate["steps"].setdefault(record["step"], {"total": 0, "failed": 0})
+    step["total"] += 1
+
+    latency = record.get("latency_ms")
+    if not record.get("success") or latency is None:
+        aggregate["failed"] += 1
+        step["failed"] += 1
+        return
+
+    # Only successful requests feed the latency stats, as in run_load_test.
+    aggregate["successful"] += 1
+    aggregate["latency_sum_ms"] += latency
+    if aggregate["latency_min_ms"] is None or latency < aggregate["latency_min_ms"]:
+        aggregate["latency_min_ms"] = latency
+    if aggregate["latency_max_ms"] is None or latency > aggregate["latency_max_ms"]:
+        aggregate["latency_max_ms"] = latency
+
+    index = len(LATENCY_BUCKETS_MS)
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if latency <= bound:
+            index = i
+            break
+    aggregate["buckets"][index] += 1
+
+
+def _merge_aggregate(into: Dict[str, Any], other: Dict[str, Any]):
+
+    for key in ("total", "successful", "failed", "latency_sum_ms"):
+        into[key] += other[key]
+
+    if other["latency_min_ms"] is not None:
+        if into["latency_min_ms"] is None:
+            into["latency_min_ms"] = other["latency_min_ms"]
+        else:
+            into["latency_min_ms"] = min(
+                into["latency_min_ms"], other["latency_min_ms"]
+            )
+    if other["latency_max_ms"] is not None:
+        if into["latency_max_ms"] is None:
+            into["latency_max_ms"] = other["latency_max_ms"]
+        else:
+            into["latency_max_ms"] = max(
+                into["latency_max_ms"], other["latency_max_ms"]
+            )
+
+    into["buckets"] = [a + b for a, b in zip(into["buckets"], other["buckets"])]
+
+    for name, counts in other["steps"].items():
+        step = into["steps"].setdefault(name, {"total": 0, "failed": 0})
+        step["total"] += counts["total"]
+        step["failed"] += counts["failed"]
+
+
+def _check_aggregate(aggregate: Any):
+    """Reject a streamed aggregate that would corrupt the totals on merge."""
+
+    def numbers(*values):
+        return all(isinstance(v, (int, float)) for v in values)
+
+    try:
+        valid = (
+            numbers(*(aggregate[k] for k in ("total", "successful", "failed")))
+            and numbers(aggregate["latency_sum_ms"])
+            and all(
+                aggregate[k] is None or numbers(aggregate[k])
+                for k in ("latency_min_ms", "latency_max_ms")
+            )
+            and len(aggregate["buckets"]) == len(LATENCY_BUCKETS_MS) + 1
+            and numbers(*aggregate["buckets"])
+            and all(
+                numbers(step["total"], step["failed"])
+                for step in aggregate["steps"].values()
+            )
+        )
+    except (KeyError, TypeError, AttributeError):
+        valid = False
+    if not valid:
+        raise ValueError("malformed interval aggregate from agent")
+
+
+def _histogram_percentile(aggregate: Dict[str, Any], percentile: float) -> float:
+    """
+    Estimate a percentile from the histogram by interpolating linearly inside
+    the bucket that holds it; the bucket is narrowed to the min/max seen.
+    """
+
+    count = aggregate["successful"]
+    rank = min(int(count * percentile) + 1, count)
+    low_seen, high_seen = aggregate["latency_min_ms"], aggregate["latency_max_ms"]
+    seen = 0
+    for i, bucket_count in enumerate(aggregate["buckets"]):
+        if seen + bucket_count >= rank:
+            lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+            upper = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else high_seen
+            lower, upper = max(lower, low_seen), min(upper, high_seen)
+            fraction = (rank - seen) / bucket_count
+            return lower + (upper - lower) * fraction
+        seen += bucket_count
+    return high_seen
+
+
+def _aggregate_metrics(aggregate: Dict[str, Any]) -> Dict[str, Any]:
+
+    total = aggregate["total"]
+    error_rate = aggregate["failed"] / total if total else 0
+
+    if aggregate["successful"]:
+        average = f"{aggregate['latency_sum_ms'] / aggregate['successful']:.2f}"
+        max_latency = f"{aggregate['latency_max_ms']:.2f}"
+        min_latency = f"{aggregate['latency_min_ms']:.2f}"
+        p90 = f"{_histogram_percentile(aggregate, 0.90):.2f}"
+    else:
+        average = max_latency = min_latency = p90 = "N/A"
+
+    return {
+        "total_requests": total,
+        "successful_requests": aggregate["successful"],
+        "failed_requests": aggregate["failed"],
+        "error_rate": f"{error_rate:.2%}",
+        "average_latency_ms": average,
+        "max_latency_ms": max_latency,
+        "min_latency_ms": min_latency,
+        # Derived from merged histograms, so not directly comparable with the
+        # exact p90_latency_ms of run_load_test.
+        "p90_latency_ms_estimate": p90,
+    }
+
+
+def _send(wfile, message: Dict[str, Any]):
+    wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+    wfile.flush()
+
+
+def _receive(rfile) -> Dict[str, Any]:
+    line = rfile.readline()
+    if not line:
+        raise ConnectionError("connection closed by peer")
+    return json.loads(line)
+
+
+# -------------------- AGENT --------------------
+
+# run_load_test arguments a controller may set; anything else is refused.
+AGENT_TEST_KEYS = {
+    "base_url",
+    "target_endpoint",
+    "http_method",
+    "existing_users_data",
+    "num_new_users",
+    "start_user_id",
+    "registration_endpoint",
+    "login_endpoint",
+    "auth_header_key",
+    "auth_token_format",
+    "delay_ms",
+    "error_threshold",
+    "target_payload",
+    "warmup_seconds",
+    "warmup_requests",
+    "warmup_endpoint",
+}
+
+
+def _is_positive_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+def _check_test_definition(test: Any):
+
+    if not isinstance(test, dict):
+        raise ValueError("test definition must be an object")
+    unexpected = set(test) - AGENT_TEST_KEYS
+    if unexpected:
+        raise ValueError(f"unexpected test keys: {sorted(unexpected)}")
+    payload = test.get("target_payload")
+    if isinstance(payload, dict) and "files" in payload:
+        # Uploads read local paths, which would expose the agent's own files.
+        raise ValueError("file upload payloads are not accepted by agents")
+
+
+class _IntervalCollector:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = _new_aggregate()
+
+    def record(self, record: Dict[str, Any]):
+        with self._lock:
+            _record_into(self._current, record)
+
+    def flush(self) -> Dict[str, Any]:
+        with self._lock:
+            aggregate, self._current = self._current, _new_aggregate()
+        return aggregate
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+
+        test = None
+        try:
+            while True:
+                message = _receive(self.rfile)
+                if not isinstance(message, dict):
+                    _send(self.wfile, {"type": "error", "error": "expected an object"})
+                    return
+                if message.get("type") == "configure":
+                    token = message.get("token")
+                    if not isinstance(token, str) or not hmac.compare_digest(
+                        token.encode("utf-8"), self.server.token.encode("utf-8")
+                    ):
+                        _send(self.wfile, {"type": "error", "error": "invalid token"})
+                        return
+                    try:
+                        _check_test_definition(message.get("test"))
+                    except ValueError as e:
+                        _send(self.wfile, {"type": "error", "error": str(e)})
+                        return
+                    test = message["test"]
+                    _send(self.wfile, {"type": "ready"})
+                elif message.get("type") == "start" and test is not None:
+                    interval_s = message.get("interval_s", 1.0)
+                    if not _is_positive_number(interval_s):
+                        _send(
+                            self.wfile,
+                            {"type": "error", "error": "interval_s must be positive"},
+                        )
+                        return
+                    self._run(test, interval_s)
+                    return
+        except (OSError, ValueError) as e:
+            logger.error(
+                json.dumps({"event": "agent_connection_lost", "error": str(e)})
+            )
+
+    def _run(self, test: Dict[str, Any], interval_s: float):
+
+        collector = _IntervalCollector()
+        cancel = threading.Event()
+        outcome: Dict[str, Any] = {}
+
+        def target():
+            try:
+                outcome["summary"] = run_load_test(
+                    **test,
+                    on_request=collector.record,
+                    metrics=self.server.metrics,
+                    cancel_event=cancel,
+                )
+            except Exception as e:
+                outcome["error"] = str(e)
+
+        worker = threading.Thread(target=target, daemon=True)
+        worker.start()
+
+        seq = 0
+        try:
+            while worker.is_alive():
+                worker.join(interval_s)
+                _send(
+                    self.wfile,
+                    {"type": "interval", "seq": seq, "aggregate": collector.flush()},
+                )
+                seq += 1
+        except BaseException:
+            # Nobody is collecting the results any more: stop generating load.
+            # Requests already in flight finish, no new ones are started.
+            cancel.set()
+            raise
+
+        if "error" in outcome:
+            _send(self.wfile, {"type": "error", "error": outcome["error"]})
+            return
+
+        summary = outcome["summary"]
+        warmup = summary["warmup"]
+        if warmup is not None:
+            warmup = {k: v for k, v in warmup.items() if k != "requests_detail"}
+        _send(
+            self.wfile,
+            {
+                "type": "done",
+                "test_mode": summary["test_mode"],
+                "num_users": summary["test_parameters"]["num_users"],
+                "total_runtime_seconds": summary["test_parameters"][
+                    "total_runtime_seconds"
+                ],
+                "warmup": warmup,
+            },
+        )
+
+
+class _AgentServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def create_agent_server(
+    token: str,
+    host: str = "127.0.0.1",
+    port: int = 7070,
+    metrics: Optional[MetricsRegistry] = None,
+) -> _AgentServer:
+    """
+    Bind a load agent; call ``serve_forever()`` on it to accept controllers.
+    Controllers must present ``token`` before the agent runs anything.
+    """
+    if not token:
+        raise ValueError("A non-empty agent token is required.")
+    server = _AgentServer((host, port), _AgentHandler)
+    server.token = token
+    server.metrics = metrics
+    return server
+
+
+def run_agent(
+    token: str,
+    host: str = "127.0.0.1",
+    port: int = 7070,
+    metrics: Optional[MetricsRegistry] = None,
+):
+
+    with create_agent_server(token, host, port, metrics) as server:
+        logger.info(
+            json.dumps(
+                {
+                    "event": "agent_listening",
+                    "host": host,
+                    "port": server.server_address[1],
+                }
+            )
+        )
+        server.serve_forever()
+
+
+# -------------------- CONTROLLER --------------------
+
+
+def parse_agent_address(address: str) -> Tuple[str, int]:
+
+    host, _, port = address.strip().rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Agent address must look like 'host:port', got '{address}'.")
+    return host, int(port)
+
+
+def _split_evenly(total: int, parts: int) -> List[Tuple[int, int]]:
+    """Split ``total`` items into ``parts`` contiguous (offset, count) ranges."""
+
+    base, extra = divmod(total, parts)
+    ranges = []
+    offset = 0
+    for i in range(parts):
+        count = base + (1 if i < extra else 0)
+        ranges.append((offset, count))
+        offset += count
+    return ranges
+
+
+def _close_agent(agent: Dict[str, Any]):
+    """Hang up on an agent now, so it sees EOF and stops its load."""
+
+    sock = agent["socket"]
+    try:
+        # The makefile() objects keep the socket open; shutdown ends it regardless.
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    for f in (agent["rfile"], agent["wfile"]):
+        try:
+            f.close()
+        except OSError:
+            pass
+    sock.close()
+
+
+def _drive_agent(
+    agent: Dict[str, Any],
+    interval_s: float,
+    read_timeout: float,
+    start_barrier: threading.Barrier,
+    on_interval,
+):
+
+    sock = agent["socket"]
+    try:
+        # Every live agent waits here so the load starts in lockstep.
+        start_barrier.wait()
+        _send(agent["wfile"], {"type": "start", "interval_s": interval_s})
+        sock.settimeout(read_timeout)
+
+        while True:
+            message = _receive(agent["rfile"])
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "interval":
+                on_interval(agent, message)
+            elif kind == "done":
+                agent["status"] = "completed"
+                agent["num_users"] = message.get("num_users")
+                agent["total_runtime_seconds"] = message.get("total_runtime_seconds")
+                agent["warmup"] = message.get("warmup")
+                return
+            elif kind == "error":
+                agent["status"] = "failed"
+                agent["error"] = message.get("error", "unknown agent error")
+                return
+            else:
+                raise ValueError(f"unexpected message from agent: {message!r}")
+    except (
+        OSError,
+        ValueError,
+        KeyError,
+        TypeError,
+        threading.BrokenBarrierError,
+    ) as e:
+        agent["status"] = "dropped"
+        agent["error"] = str(e) or type(e).__name__
+        logger.error(
+            json.dumps(
+                {
+                    "event": "agent_dropped",
+                    "agent": agent["agent"],
+                    "error": agent["error"],
+                }
+            )
+        )
+    finally:
+        _close_agent(agent)
+
+
+def run_distributed_load_test(
+    agents: List[str],
+    base_url: str,
+    target_endpoint: str,
+    http_method: str,
+    existing_users_data: List[Dict[str, Any]] = None,
+    num_new_users: int = 0,
+    start_user_id: int = 1,
+    registration_endpoint: str = "/api/v1/register",
+    login_endpoint: str = "/api/v1/login",
+    auth_header_key: str = "Authorization",
+    auth_token_format: str = "Bearer {token}",
+    delay_ms: int = 50,
+    error_threshold: float = 0.05,
+    target_payload: Dict[str, Any] = None,
+    interval_s: float = 1.0,
+    connect_timeout: float = 5.0,
+    warmup_seconds: float = 0.0,
+    warmup_requests: int = 0,
+    warmup_endpoint: Optional[str] = None,
+    token: Optional[str] = None,
+) -> Dict[str, Any]:
+
+    if not _is_positive_number(interval_s):
+        raise ValueError("'interval_s' must be a positive number of seconds.")
+
+    if num_new_users > 0:
+        num_users = num_new_users
+        mode = "New Users (Registration + Login)"
+    elif existing_users_data:
+        num_users = len(existing_users_data)
+        mode = "Existing Users (Login Only)"
+    else:
+        raise ValueError(
+            "Must provide either 'existing_users_data' or a positive 'num_new_users'."
+        )
+
+    agent_states: List[Dict[str, Any]] = []
+    for address in agents:
+        state: Dict[str, Any] = {"agent": address, "status": "unreachable"}
+        agent_states.append(state)
+        try:
+            host, port = parse_agent_address(address)
+            sock = socket.create_connection((host, port), timeout=connect_timeout)
+        except (OSError, ValueError) as e:
+            state["error"] = str(e)
+            continue
+        state.update(
+            {
+                "status": "connected",
+                "socket": sock,
+                "rfile": sock.makefile("rb"),
+                "wfile": sock.makefile("wb"),
+            }
+        )
+
+    connected = [a for a in agent_states if a["status"] == "connected"]
+    if not connected:
+        reasons = "; ".join(f"{a['agent']}: {a['error']}" for a in agent_states)
+        raise ConnectionError(f"None of the load agents could be reached ({reasons}).")
+
+    # --- SHIP THE TEST DEFINITION AND USER ID RANGES ---
+    common_test = {
+        "base_url": base_url,
+        "target_endpoint": target_endpoint,
+        "http_method": http_method,
+        "registration_endpoint": registration_endpoint,
+        "login_endpoint": login_endpoint,
+        "auth_header_key": auth_header_key,
+        "auth_token_format": auth_token_format,
+        "delay_ms": delay_ms,
+        "error_threshold": error_threshold,
+        "target_payload": target_payload,
+        "warmup_seconds": warmup_seconds,
+        "warmup_requests": warmup_requests,
+        "warmup_endpoint": warmup_endpoint,
+    }
+
+    ready = []
+    for agent, (offset, count) in zip(
+        connected, _split_evenly(num_users, len(connected))
+    ):
+        if count == 0:
+            agent["status"] = "idle"
+            _close_agent(agent)
+            continue
+
+        test = dict(common_test)
+        if num_new_users > 0:
+            test["num_new_users"] = count
+            test["start_user_id"] = start_user_id + offset
+            agent["user_id_range"] = [
+                start_user_id + offset,
+                start_user_id + offset + count - 1,
+            ]
+        else:
+            test["existing_users_data"] = existing_users_data[offset : offset + count]
+        agent["assigned_users"] = count
+
+        try:
+            _send(agent["wfile"], {"type": "configure", "token": token, "test": test})
+            reply = _receive(agent["rfile"])
+            if not isinstance(reply, dict):
+                raise ValueError(f"unexpected reply from agent: {reply!r}")
+            if reply.get("type") != "ready":
+                raise ConnectionError(
+                    reply.get("error", "agent did not acknowledge the test definition")
+                )
+        except (OSError, ValueError) as e:
+            agent["status"] = "dropped"
+            agent["error"] = str(e)
+            _close_agent(agent)
+            continue
+        agent["status"] = "ready"
+        ready.append(agent)
+
+    if not ready:
+        reasons = "; ".join(
+            f"{a['agent']}: {a['error']}" for a in agent_states if a.get("error")
+        )
+        raise ConnectionError(
+            f"No load agent accepted the test definition ({reasons})."
+        )
+
+    # --- RUN AND COLLECT STREAMED INTERVALS ---
+    lock = threading.Lock()
+    totals = _new_aggregate()
+    timeline: Dict[int, Dict[str, Any]] = {}
+
+    def on_interval(agent, message):
+        aggregate = message.get("aggregate")
+        _check_aggregate(aggregate)
+        if not isinstance(message.get("seq"), int):
+            raise ValueError("interval message without a sequence number")
+        with lock:
+            _merge_aggregate(totals, aggregate)
+            _merge_aggregate(
+                timeline.setdefault(message["seq"], _new_aggregate()), aggregate
+            )
+            agent["requests"] = agent.get("requests", 0) + aggregate["total"]
+
+    # Agents emit an interval every interval_s, so silence well past that is a drop.
+    read_timeout = max(interval_s * 5, connect_timeout)
+    start_barrier = threading.Barrier(len(ready))
+    start_total = time.time()
+
+    with ThreadPoolExecutor(max_workers=len(ready)) as executor:
+        futures = [
+            executor.submit(
+                _drive_agent,
+                agent,
+                interval_s,
+                read_timeout,
+                start_barrier,
+                on_interval,
+            )
+            for agent in ready
+        ]
+        for f in futures:
+            f.result()
+
+    end_total = time.time()
+
+    for agent in agent_states:
+        for key in ("socket", "rfile", "wfile"):
+            agent.pop(key, None)
+
+    metrics = _aggregate_metrics(totals)
+    summary = {
+        "test_mode": mode,
+        "test_parameters": {
+            "num_users": num_users,
+            "num_agents": len(agents),
+            "http_method": http_method,
+            "target_endpoint": target_endpoint,
+            "total_runtime_seconds": f"{end_total - start_total:.2f}",
+        },
+        "metrics": metrics,
+        "steps": totals["steps"],
+        "latency_histogram_ms": {
+            "buckets": list(LATENCY_BUCKETS_MS) + ["+Inf"],
+            "counts": totals["buckets"],
+        },
+        "intervals": [
+            {
+                "interval": seq,
+                "interval_s": interval_s,
+                **_aggregate_metrics(timeline[seq]),
+            }
+            for seq in sorted(timeline)
+        ],
+        "agents": agent_states,
+    }
+
+    error_rate = totals["failed"] / totals["total"] if totals["total"] else 0
+    if error_rate > error_threshold:
+        logger.warning(
+            json.dumps(
+                {
+                    "event": "error_rate_exceeded",
+                    "threshold": f"{error_threshold:.2%}",
+                    "actual_rate": f"{error_rate:.2%}",
+                    "message": "The API's error rate is unacceptably high under this load.",
+                }
+            )
+        )
+
+    return summary
@@ -13,6 +13,7 @@ def perform_http_request(
     payload: Optional[Any] = None,
     files_to_upload: Optional[FileStructure] = None,
     timeout: float = 5.0,
+    session: Optional[requests.Session] = None,
 ) -> Dict[str, Any]:
 
     method = method.upper()
@@ -52,7 +53,9 @@ def perform_http_request(
 
     try:
 
-        response = requests.request(method, url, **request_kwargs)
+        # A shared session reuses keep-alive connections across calls.
+        http = session if session is not None else requests
+        response = http.request(method, url, **request_kwargs)
         end_time = time.perf_counter()
 
         status_code = response.status_code
@@ -3,11 +3,15 @@ import json
 import random
 import string
 import logging
-from typing import List, Dict, Any
+import threading
+import http.cookiejar
+from typing import List, Dict, Any, Callable, Optional
 from concurrent.futures import ThreadPoolExecutor
 import sys
+import requests
+from requests.adapters import HTTPAdapter
 from netpulse.core_http import perform_http_request
-
+from netpulse.core_metrics import MetricsRegistry
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,6 +20,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+RequestHook = Callable[[Dict[str, Any]], None]
+
 
 def generate_user_data(user_id: int) -> Dict[str, str]:
 
@@ -25,7 +31,28 @@ def generate_user_data(user_id: int) -> Dict[str, str]:
     return {"username": username_base, "email": email, "password": password}
 
 
-def _request_and_record(url, method, payload, headers, step_name, user_metrics):
+def _request_and_record(
+    url,
+    method,
+    payload,
+    headers,
+    step_name,
+    user_metrics,
+    on_request=None,
+    session=None,
+    metrics=None,
+    cancel_event=None,
+):
+
+    if cancel_event is not None and cancel_event.is_set():
+        # Nothing is sent or recorded once the run has been cancelled.
+        return {
+            "status_code": -1,
+            "latency_ms": None,
+            "success": False,
+            "response_data": {},
+            "error": "Load test cancelled.",
+        }
 
     files_to_send = None
     data_payload = payload
@@ -49,6 +76,8 @@ def _request_and_record(url, method, payload, headers, step_name, user_metrics):
     # print(data_payload) # Debug print temporarily removed, but was helpful
 
     # --- 2. EXECUTE THE REQUEST ---
+    if metrics is not None:
+        metrics.request_started()
     # The crucial call now separates data and file arguments
     result = perform_http_request(
         url=url,
@@ -56,20 +85,25 @@ def _request_and_record(url, method, payload, headers, step_name, user_metrics):
         payload=data_payload,
         headers=headers,
         files_to_upload=files_to_send,  # Passes the file path dictionary or None
+        session=session,
     )
 
     # --- 3. RECORD METRICS ---
-    user_metrics["requests"].append(
-        {
-            "step": step_name,
-            "method": method,
-            "url": url,
-            "latency_ms": result.get("latency_ms"),
-            "success": result.get("success"),
-            "status_code": result.get("status_code"),
-            "payload": metric_payload,
-        }
-    )
+    record = {
+        "step": step_name,
+        "method": method,
+        "url": url,
+        "latency_ms": result.get("latency_ms"),
+        "success": result.get("success"),
+        "status_code": result.get("status_code"),
+        "payload": metric_payload,
+    }
+    user_metrics["requests"].append(record)
+
+    if metrics is not None:
+        metrics.request_finished(record)
+    if on_request is not None:
+        on_request(record)
 
     return result
 
@@ -85,6 +119,10 @@ def simulate_user(
     auth_token_format: str,
     delay_ms: int,
     target_payload: Dict[str, Any] = None,
+    on_request: Optional[RequestHook] = None,
+    session: Optional[requests.Session] = None,
+    metrics: Optional[MetricsRegistry] = None,
+    cancel_event: Optional[threading.Event] = None,
 ):
 
     user_id = user_data.get("email") or user_data.get("id", "unknown_user")
@@ -102,7 +140,16 @@ def simulate_user(
 
         reg_url = base_url + registration_endpoint
         reg_result = _request_and_record(
-            reg_url, "POST", login_payload, None, "registration", user_metrics
+            reg_url,
+            "POST",
+            login_payload,
+            None,
+            "registration",
+            user_metrics,
+            on_request,
+            session,
+            metrics,
+            cancel_event,
         )
 
         if not reg_result["success"]:
@@ -118,7 +165,16 @@ def simulate_user(
     }
 
     login_result = _request_and_record(
-        login_url, "POST", credentials, None, "login", user_metrics
+        login_url,
+        "POST",
+        credentials,
+        None,
+        "login",
+        user_metrics,
+        on_request,
+        session,
+        metrics,
+        cancel_event,
     )
 
     if login_result["success"] and "token" in login_result["response_data"]:
@@ -150,11 +206,121 @@ def simulate_user(
         headers,
         "authenticated_target",
         user_metrics,
+        on_request,
+        session,
+        metrics,
+        cancel_event,
     )
 
     return user_metrics
 
 
+def get_latency_stat(data, percentile=None):
+    if not data:
+        return "N/A"
+    if percentile is None:
+        return f"{sum(data) / len(data):.2f}"
+    if percentile == "max":
+        return f"{max(data):.2f}"
+    if percentile == "min":
+        return f"{min(data):.2f}"
+    return f"{sorted(data)[int(len(data) * percentile)]:.2f}"
+
+
+def create_session(pool_size: int) -> requests.Session:
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Users authenticate with tokens; a shared cookie jar would leak state between them.
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def run_warmup(
+    session: requests.Session,
+    url: str,
+    concurrency: int,
+    warmup_seconds: float = 0.0,
+    warmup_requests: int = 0,
+    cancel_event: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    """
+    Send GET traffic to ``url`` from ``concurrency`` threads until the request
+    count or the duration is used up, whichever comes first. Every thread sends
+    at least one request (so ``warmup_requests`` below ``concurrency`` is
+    effectively ``concurrency``), and the first round is released together so those
+    requests overlap and each opens its own keep-alive connection.
+    """
+
+    lock = threading.Lock()
+    first_round = threading.Barrier(concurrency)
+    sent = [0]
+    deadline = time.perf_counter() + warmup_seconds
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def budget_left():
+        if cancelled():
+            return False
+        if warmup_requests and sent[0] >= warmup_requests:
+            return False
+        if warmup_seconds and time.perf_counter() >= deadline:
+            return False
+        return True
+
+    def worker():
+        records = []
+        if cancelled():
+            # Release the threads already waiting for the first round.
+            first_round.abort()
+            return records
+        try:
+            first_round.wait()
+        except threading.BrokenBarrierError:
+            return records
+        while True:
+            with lock:
+                if cancelled() or (records and not budget_left()):
+                    return records
+                sent[0] += 1
+            result = perform_http_request(url, "GET", session=session)
+            records.append(
+                {
+                    "step": "warmup",
+                    "method": "GET",
+                    "url": url,
+                    "latency_ms": result.get("latency_ms"),
+                    "success": result.get("success"),
+                    "status_code": result.get("status_code"),
+                }
+            )
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(worker) for _ in range(concurrency)]
+        records = [r for f in futures for r in f.result()]
+    end = time.time()
+
+    latencies = [r["latency_ms"] for r in records if r["success"]]
+    successful = sum(r["success"] for r in records)
+
+    return {
+        "concurrency": concurrency,
+        "duration_seconds": f"{end - start:.2f}",
+        "total_requests": len(records),
+        "successful_requests": successful,
+        "failed_requests": len(records) - successful,
+        "average_latency_ms": get_latency_stat(latencies),
+        "max_latency_ms": get_latency_stat(latencies, "max"),
+        "min_latency_ms": get_latency_stat(latencies, "min"),
+        "p90_latency_ms": get_latency_stat(latencies, 0.90),
+        "requests_detail": records,
+    }
+
+
 def run_load_test(
     base_url: str,
     target_endpoint: str,
@@ -169,6 +335,12 @@ def run_load_test(
     delay_ms: int = 50,
     error_threshold: float = 0.05,
     target_payload: Dict[str, Any] = None,
+    on_request: Optional[RequestHook] = None,
+    warmup_seconds: float = 0.0,
+    warmup_requests: int = 0,
+    warmup_endpoint: Optional[str] = None,
+    metrics: Optional[MetricsRegistry] = None,
+    cancel_event: Optional[threading.Event] = None,
 ) -> Dict[str, Any]:
 
     if num_new_users > 0:
@@ -188,6 +360,22 @@ def run_load_test(
 
     num_users = len(users_data)
 
+    # --- WARM-UP (recorded separately, excluded from the metrics) ---
+    # Only a warmed run shares one pooled session; otherwise every request
+    # opens a fresh connection, as it always has.
+    session = None
+    warmup = None
+    if warmup_seconds > 0 or warmup_requests > 0:
+        session = create_session(num_users)
+        warmup = run_warmup(
+            session,
+            base_url + (warmup_endpoint or target_endpoint),
+            num_users,
+            warmup_seconds=warmup_seconds,
+            warmup_requests=warmup_requests,
+            cancel_event=cancel_event,
+        )
+
     common_args = {
         "base_url": base_url,
         "registration_endpoint": registration_endpoint,
@@ -198,20 +386,35 @@ def run_load_test(
         "auth_token_format": auth_token_format,
         "delay_ms": delay_ms,
         "target_payload": target_payload,
+        "on_request": on_request,
+        "session": session,
+        "metrics": metrics,
+        "cancel_event": cancel_event,
     }
 
+    def run_user(data):
+        if cancel_event is not None and cancel_event.is_set():
+            user_id = data.get("email") or data.get("id", "unknown_user")
+            return {"user_id": user_id, "requests": []}
+        if metrics is None:
+            return simulate_user(user_data=data, **common_args)
+        metrics.user_started()
+        try:
+            return simulate_user(user_data=data, **common_args)
+        finally:
+            metrics.user_finished()
+
     # --- CONCURRENT EXECUTION USING THREADING ---
     start_total = time.time()
 
     with ThreadPoolExecutor(max_workers=num_users) as executor:
-        futures = [
-            executor.submit(simulate_user, user_data=data, **common_args)
-            for data in users_data
-        ]
+        futures = [executor.submit(run_user, data) for data in users_data]
 
         user_results = [f.result() for f in futures]
 
     end_total = time.time()
+    if session is not None:
+        session.close()
 
     all_latencies_ms = [
         r["latency_ms"]
@@ -227,17 +430,6 @@ def run_load_test(
     failed_requests = total_requests - successful_requests
     error_rate = failed_requests / total_requests if total_requests else 0
 
-    def get_latency_stat(data, percentile=None):
-        if not data:
-            return "N/A"
-        if percentile is None:
-            return f"{sum(data) / len(data):.2f}"
-        if percentile == "max":
-            return f"{max(data):.2f}"
-        if percentile == "min":
-            return f"{min(data):.2f}"
-        return f"{sorted(data)[int(len(data) * percentile)]:.2f}"
-
     summary = {
         "test_mode": mode,
         "test_parameters": {
@@ -256,6 +448,8 @@ def run_load_test(
             "min_latency_ms": get_latency_stat(all_latencies_ms, "min"),
             "p90_latency_ms": get_latency_stat(all_latencies_ms, 0.90),
         },
+        "warmup": warmup,
+        "cancelled": cancel_event is not None and cancel_event.is_set(),
         "user_results_detail": user_results,
     }
 
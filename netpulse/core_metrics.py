@@ -0,0 +1,241 @@
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Tuple
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Upper bounds (ms) of the latency histogram buckets; a final +Inf bucket is implied.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_LATENCY_BUCKETS_S = [bound / 1000.0 for bound in LATENCY_BUCKETS_MS]
+
+
+class _Shard:
+    __slots__ = ("values", "__weakref__")
+
+    def __init__(self):
+        self.values: Dict[Tuple, float] = {}
+
+
+def _add_into(totals: Dict[Tuple, float], values: Dict[Tuple, float]):
+    for key, value in values.copy().items():
+        totals[key] = totals.get(key, 0) + value
+
+
+class _ShardedCounters:
+    """
+    Counters split into one dict per thread. Writers only touch their own
+    shard, so the request path never takes a lock; readers sum the shards.
+    When a thread exits its shard is folded into a base total, so short-lived
+    worker threads don't leave shards behind.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._base: Dict[Tuple, float] = {}
+        self._shards: Dict[int, Dict[Tuple, float]] = {}
+
+    def _shard(self) -> Dict[Tuple, float]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            # Taken once per thread, on its first update.
+            with self._lock:
+                self._shards[id(shard.values)] = shard.values
+            # The thread-local drops the shard when its thread exits.
+            weakref.finalize(shard, self._retire, shard.values)
+        return shard.values
+
+    def _retire(self, values: Dict[Tuple, float]):
+        with self._lock:
+            self._shards.pop(id(values), None)
+            _add_into(self._base, values)
+
+    def inc(self, key: Tuple, amount: float = 1):
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + amount
+
+    def shard_count(self) -> int:
+        with self._lock:
+            return len(self._shards)
+
+    def snapshot(self) -> Dict[Tuple, float]:
+        totals: Dict[Tuple, float] = {}
+        with self._lock:
+            _add_into(totals, self._base)
+            for values in self._shards.values():
+                _add_into(totals, values)
+        return totals
+
+
+def _labels(**labels) -> str:
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        value = value.replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Live load test and ping metrics, rendered in OpenMetrics text format."""
+
+    def __init__(self):
+        self._counters = _ShardedCounters()
+        # Last ping result per target; plain assignment is atomic under the GIL.
+        self._ping_state: Dict[str, Dict[str, float]] = {}
+
+    # -------------------- LOAD --------------------
+
+    def user_started(self):
+        self._counters.inc(("active_users",))
+
+    def user_finished(self):
+        self._counters.inc(("active_users",), -1)
+
+    def request_started(self):
+        self._counters.inc(("in_flight",))
+
+    def request_finished(self, record: Dict[str, Any]):
+
+        step = record["step"]
+        self._counters.inc(("in_flight",), -1)
+        self._counters.inc(("requests", step, str(record.get("status_code"))))
+
+        latency_ms = record.get("latency_ms")
+        if latency_ms is None:
+            return
+
+        index = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                index = i
+                break
+        self._counters.inc(("latency_bucket", step, index))
+        self._counters.inc(("latency_count", step))
+        self._counters.inc(("latency_sum", step), latency_ms / 1000.0)
+
+    # -------------------- PING --------------------
+
+    def observe_ping(self, result: Dict[str, Any]):
+
+        target = f"{result['host']}:{result['port']}"
+        outcome = "success" if result["success"] else "failure"
+        self._counters.inc(("pings", target, outcome))
+
+        # A failed ping keeps the last successful handshake time.
+        state = dict(self._ping_state.get(target, {}))
+        state["up"] = 1 if result["success"] else 0
+        if result.get("handshake_time"):
+            # tcp_ping reports e.g. "12.34 ms"
+            state["handshake"] = float(result["handshake_time"].split()[0]) / 1000.0
+        self._ping_state[target] = state
+
+    # -------------------- EXPOSITION --------------------
+
+    def render(self) -> str:
+
+        counters = self._counters.snapshot()
+        lines = []
+
+        lines.append("# TYPE netpulse_requests counter")
+        lines.append("# HELP netpulse_requests Load test requests by step and status.")
+        for key in sorted(k for k in counters if k[0] == "requests"):
+            labels = _labels(step=key[1], status=key[2])
+            lines.append(f"netpulse_requests_total{labels} {_value(counters[key])}")
+
+        lines.append("# TYPE netpulse_requests_in_flight gauge")
+        lines.append("# HELP netpulse_requests_in_flight Requests currently in flight.")
+        in_flight = counters.get(("in_flight",), 0)
+        lines.append(f"netpulse_requests_in_flight {_value(in_flight)}")
+
+        lines.append("# TYPE netpulse_active_users gauge")
+        lines.append("# HELP netpulse_active_users Simulated users currently running.")
+        active = counters.get(("active_users",), 0)
+        lines.append(f"netpulse_active_users {_value(active)}")
+
+        lines.append("# TYPE netpulse_request_latency_seconds histogram")
+        lines.append("# UNIT netpulse_request_latency_seconds seconds")
+        lines.append(
+            "# HELP netpulse_request_latency_seconds Load test request latency."
+        )
+        steps = sorted({k[1] for k in counters if k[0] == "latency_count"})
+        for step in steps:
+            cumulative = 0
+            for i, bound in enumerate(_LATENCY_BUCKETS_S + ["+Inf"]):
+                cumulative += counters.get(("latency_bucket", step, i), 0)
+                labels = _labels(step=step, le=bound)
+                lines.append(
+                    f"netpulse_request_latency_seconds_bucket{labels} {cumulative}"
+                )
+            labels = _labels(step=step)
+            count = counters[("latency_count", step)]
+            total = counters.get(("latency_sum", step), 0.0)
+            lines.append(f"netpulse_request_latency_seconds_count{labels} {count}")
+            lines.append(
+                f"netpulse_request_latency_seconds_sum{labels} {_value(total)}"
+            )
+
+        lines.append("# TYPE netpulse_pings counter")
+        lines.append("# HELP netpulse_pings TCP pings by target and outcome.")
+        for key in sorted(k for k in counters if k[0] == "pings"):
+            labels = _labels(target=key[1], result=key[2])
+            lines.append(f"netpulse_pings_total{labels} {_value(counters[key])}")
+
+        ping_state = dict(self._ping_state)
+        lines.append("# TYPE netpulse_ping_up gauge")
+        lines.append("# HELP netpulse_ping_up Whether the last ping succeeded.")
+        for target in sorted(ping_state):
+            labels = _labels(target=target)
+            lines.append(f"netpulse_ping_up{labels} {ping_state[target]['up']}")
+
+        lines.append("# TYPE netpulse_ping_handshake_seconds gauge")
+        lines.append("# UNIT netpulse_ping_handshake_seconds seconds")
+        lines.append(
+            "# HELP netpulse_ping_handshake_seconds TCP handshake time of the last "
+            "successful ping."
+        )
+        for target in sorted(ping_state):
+            if "handshake" in ping_state[target]:
+                labels = _labels(target=target)
+                value = _value(ping_state[target]["handshake"])
+                lines.append(f"netpulse_ping_handshake_seconds{labels} {value}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(
+    registry: MetricsRegistry, port: int = 9100, host: str = "0.0.0.0"
+) -> ThreadingHTTPServer:
+    """Serve ``registry`` on ``/metrics`` from a background thread."""
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
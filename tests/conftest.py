@@ -0,0 +1,52 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+
+class _FakeApi(BaseHTTPRequestHandler):
+    """Minimal register/login/target API; login always hands out a token."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = {"token": "abc"} if self.path == "/api/v1/login" else {}
+        self._reply(body)
+
+    def do_GET(self):
+        self._reply({"ok": True})
+
+    def _reply(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class _FakeApiServer(ThreadingHTTPServer):
+    # Many users connect at once; the default backlog of 5 resets some of them.
+    request_queue_size = 128
+
+
+@pytest.fixture
+def fake_api():
+    server = _FakeApiServer(("127.0.0.1", 0), _FakeApi)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
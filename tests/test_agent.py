@@ -0,0 +1,243 @@
+import json
+import socket
+import socketserver
+import threading
+import time
+import pytest
+from netpulse.core_agent import (
+    _aggregate_metrics,
+    _new_aggregate,
+    _record_into,
+    create_agent_server,
+    run_distributed_load_test,
+)
+
+
+def _serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_distributed_load_merges_agents_and_tolerates_dropout(fake_api):
+    agents = [_serve(create_agent_server("secret", "127.0.0.1", 0)) for _ in range(2)]
+    addresses = [f"127.0.0.1:{a.server_address[1]}" for a in agents]
+    addresses.append(f"127.0.0.1:{_unused_port()}")
+
+    try:
+        result = run_distributed_load_test(
+            addresses,
+            base_url=fake_api.base_url,
+            target_endpoint="/api/v1/test",
+            http_method="GET",
+            num_new_users=5,
+            start_user_id=10,
+            delay_ms=0,
+            interval_s=0.2,
+            token="secret",
+        )
+    finally:
+        for server in agents:
+            server.shutdown()
+
+    # registration + login + target for each of the 5 users
+    assert result["metrics"]["total_requests"] == 15
+    assert result["metrics"]["failed_requests"] == 0
+    assert result["steps"]["authenticated_target"]["total"] == 5
+    assert sum(result["latency_histogram_ms"]["counts"]) == 15
+
+    statuses = [a["status"] for a in result["agents"]]
+    assert statuses == ["completed", "completed", "unreachable"]
+    assert [a["user_id_range"] for a in result["agents"][:2]] == [[10, 12], [13, 14]]
+
+
+@pytest.mark.parametrize(
+    "token, payload",
+    [("wrong", None), ("secret", {"files": {"file": "/etc/passwd"}})],
+)
+def test_agent_rejects_bad_token_and_file_uploads(fake_api, token, payload):
+    agent = _serve(create_agent_server("secret", "127.0.0.1", 0))
+    try:
+        with pytest.raises(ConnectionError, match="127.0.0.1:"):
+            run_distributed_load_test(
+                [f"127.0.0.1:{agent.server_address[1]}"],
+                base_url=fake_api.base_url,
+                target_endpoint="/api/v1/test",
+                http_method="POST",
+                num_new_users=1,
+                target_payload=payload,
+                token=token,
+            )
+    finally:
+        agent.shutdown()
+
+
+def _fake_agent(after_start: bytes):
+    """Accept the test, then answer ``start`` with ``after_start`` and hang up."""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            self.rfile.readline()
+            self.wfile.write(b'{"type": "ready"}\n')
+            self.rfile.readline()
+            self.wfile.write(after_start)
+
+    return _serve(socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler))
+
+
+@pytest.mark.parametrize(
+    "after_start",
+    [b"", b'{"kind": "interval"}\n', b'{"type": "interval", "seq": 0}\n'],
+)
+def test_agent_dropping_after_ready_is_tolerated(fake_api, after_start):
+    agent = _serve(create_agent_server("secret", "127.0.0.1", 0))
+    broken = _fake_agent(after_start)
+
+    try:
+        result = run_distributed_load_test(
+            [
+                f"127.0.0.1:{agent.server_address[1]}",
+                f"127.0.0.1:{broken.server_address[1]}",
+            ],
+            base_url=fake_api.base_url,
+            target_endpoint="/api/v1/test",
+            http_method="GET",
+            num_new_users=4,
+            delay_ms=0,
+            interval_s=0.2,
+            token="secret",
+        )
+    finally:
+        agent.shutdown()
+        broken.shutdown()
+
+    assert [a["status"] for a in result["agents"]] == ["completed", "dropped"]
+    assert result["metrics"]["total_requests"] == 6
+
+
+def test_dropped_agent_is_hung_up_on_before_the_run_ends(fake_api):
+    hung_up = {}
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            self.rfile.readline()
+            self.wfile.write(b'{"type": "ready"}\n')
+            self.rfile.readline()
+            self.wfile.write(b"[]\n")
+            self.wfile.flush()
+            # Blocks until the controller closes the connection.
+            self.rfile.readline()
+            hung_up["at"] = time.monotonic()
+
+    agent = _serve(create_agent_server("secret", "127.0.0.1", 0))
+    broken = _serve(socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler))
+
+    try:
+        result = run_distributed_load_test(
+            [
+                f"127.0.0.1:{agent.server_address[1]}",
+                f"127.0.0.1:{broken.server_address[1]}",
+            ],
+            base_url=fake_api.base_url,
+            target_endpoint="/api/v1/test",
+            http_method="GET",
+            num_new_users=2,
+            delay_ms=1500,
+            interval_s=0.2,
+            token="secret",
+        )
+        finished_at = time.monotonic()
+    finally:
+        agent.shutdown()
+        broken.shutdown()
+
+    assert result["agents"][1]["status"] == "dropped"
+    assert hung_up["at"] < finished_at - 1
+
+
+@pytest.mark.parametrize("reply", [b"[]\n", b"not json\n", b'{"type": "other"}\n'])
+def test_agent_with_bad_configure_reply_is_dropped(fake_api, reply):
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            self.rfile.readline()
+            self.wfile.write(reply)
+
+    agent = _serve(create_agent_server("secret", "127.0.0.1", 0))
+    broken = _serve(socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler))
+
+    try:
+        result = run_distributed_load_test(
+            [
+                f"127.0.0.1:{agent.server_address[1]}",
+                f"127.0.0.1:{broken.server_address[1]}",
+            ],
+            base_url=fake_api.base_url,
+            target_endpoint="/api/v1/test",
+            http_method="GET",
+            num_new_users=2,
+            delay_ms=0,
+            interval_s=0.2,
+            token="secret",
+        )
+    finally:
+        agent.shutdown()
+        broken.shutdown()
+
+    assert [a["status"] for a in result["agents"]] == ["completed", "dropped"]
+    assert result["metrics"]["total_requests"] == 3
+
+
+def _configure(token="secret"):
+    test = {
+        "base_url": "http://127.0.0.1:1",
+        "target_endpoint": "/",
+        "http_method": "GET",
+    }
+    return json.dumps({"type": "configure", "token": token, "test": test}).encode()
+
+
+@pytest.mark.parametrize(
+    "messages",
+    [
+        [b"[]"],
+        [_configure("s\u00e9cret")],
+        [_configure(), b'{"type": "start", "interval_s": 0}'],
+        [_configure(), b'{"type": "start", "interval_s": "1"}'],
+    ],
+)
+def test_agent_rejects_malformed_controller_messages(messages):
+    agent = _serve(create_agent_server("secret", "127.0.0.1", 0))
+    try:
+        with socket.create_connection(agent.server_address, timeout=5) as sock:
+            replies = sock.makefile("rb")
+            for message in messages:
+                sock.sendall(message + b"\n")
+                reply = json.loads(replies.readline())
+            assert reply["type"] == "error"
+            assert replies.readline() == b""
+    finally:
+        agent.shutdown()
+
+
+def test_controller_rejects_non_positive_interval():
+    with pytest.raises(ValueError):
+        run_distributed_load_test(
+            ["127.0.0.1:1"], "http://x", "/", "GET", num_new_users=1, interval_s=0
+        )
+
+
+def test_histogram_p90_is_interpolated_and_marked_as_estimate():
+    aggregate = _new_aggregate()
+    for latency in [20] * 80 + [101, 102] * 10:
+        _record_into(aggregate, {"step": "s", "success": True, "latency_ms": latency})
+
+    metrics = _aggregate_metrics(aggregate)
+    assert "p90_latency_ms" not in metrics
+    # true p90 is ~101.5 ms, inside the 100-250 ms bucket
+    assert 101 <= float(metrics["p90_latency_ms_estimate"]) <= 102
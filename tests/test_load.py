@@ -1,6 +1,62 @@
+import threading
 from netpulse.core_load import run_load_test
 
 
 def test_load():
     result = run_load_test("https://www.jumia.com.ng", "GET", "GET", 0, 2)
     assert "metrics" in result
+
+
+def test_warmup_is_excluded_from_metrics(fake_api):
+    result = run_load_test(
+        fake_api.base_url,
+        "/api/v1/test",
+        "GET",
+        num_new_users=3,
+        delay_ms=0,
+        warmup_requests=6,
+    )
+    assert result["warmup"]["total_requests"] == 6
+    assert result["metrics"]["total_requests"] == 9
+    # The measured users reuse the keep-alive connections opened during warm-up.
+    assert fake_api.connections == 3
+
+
+def test_cancelled_run_sends_nothing(fake_api):
+    cancel = threading.Event()
+    cancel.set()
+    result = run_load_test(
+        fake_api.base_url,
+        "/api/v1/test",
+        "GET",
+        num_new_users=2,
+        delay_ms=0,
+        cancel_event=cancel,
+    )
+    assert result["cancelled"] is True
+    assert result["metrics"]["total_requests"] == 0
+    assert fake_api.connections == 0
+
+
+def test_unwarmed_run_opens_fresh_connections(fake_api):
+    result = run_load_test(
+        fake_api.base_url, "/api/v1/test", "GET", num_new_users=3, delay_ms=0
+    )
+    assert result["warmup"] is None
+    assert fake_api.connections == 9
+
+
+def test_cancelled_run_skips_warmup(fake_api):
+    cancel = threading.Event()
+    cancel.set()
+    result = run_load_test(
+        fake_api.base_url,
+        "/api/v1/test",
+        "GET",
+        num_new_users=4,
+        delay_ms=0,
+        warmup_requests=4,
+        cancel_event=cancel,
+    )
+    assert result["warmup"]["total_requests"] == 0
+    assert fake_api.connections == 0
@@ -0,0 +1,80 @@
+import socket
+import urllib.request
+from netpulse.core_load import run_load_test
+from netpulse.core_metrics import MetricsRegistry, start_metrics_server
+from netpulse.core_ping import tcp_ping
+
+
+def _scrape(server):
+    url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+    with urllib.request.urlopen(url, timeout=5) as response:
+        assert response.headers["Content-Type"].startswith(
+            "application/openmetrics-text"
+        )
+        return response.read().decode()
+
+
+def test_scrape_load_and_ping_metrics(fake_api):
+    registry = MetricsRegistry()
+    server = start_metrics_server(registry, port=0, host="127.0.0.1")
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    target = f"127.0.0.1:{listener.getsockname()[1]}"
+
+    try:
+        run_load_test(
+            fake_api.base_url,
+            "/api/v1/test",
+            "GET",
+            num_new_users=3,
+            delay_ms=0,
+            metrics=registry,
+        )
+        registry.observe_ping(tcp_ping("127.0.0.1", listener.getsockname()[1]))
+        body = _scrape(server)
+    finally:
+        listener.close()
+        server.shutdown()
+
+    lines = body.splitlines()
+    assert lines[-1] == "# EOF"
+    assert 'netpulse_requests_total{step="login",status="200"} 3' in lines
+    assert "netpulse_requests_in_flight 0" in lines
+    assert "netpulse_active_users 0" in lines
+    assert 'netpulse_request_latency_seconds_bucket{step="login",le="+Inf"} 3' in lines
+    assert 'netpulse_request_latency_seconds_count{step="registration"} 3' in lines
+
+    assert f'netpulse_pings_total{{target="{target}",result="success"}} 1' in lines
+    assert f'netpulse_ping_up{{target="{target}"}} 1' in lines
+    handshake = [
+        line
+        for line in lines
+        if line.startswith(f'netpulse_ping_handshake_seconds{{target="{target}"}}')
+    ]
+    assert len(handshake) == 1
+
+    # The listener is closed now, so this ping fails but keeps the handshake.
+    registry.observe_ping(tcp_ping("127.0.0.1", int(target.split(":")[1])))
+    lines = registry.render().splitlines()
+    assert f'netpulse_ping_up{{target="{target}"}} 0' in lines
+    assert handshake[0] in lines
+
+
+def test_finished_threads_fold_their_shards(fake_api):
+    registry = MetricsRegistry()
+    for _ in range(5):
+        run_load_test(
+            fake_api.base_url,
+            "/api/v1/test",
+            "GET",
+            num_new_users=20,
+            delay_ms=0,
+            metrics=registry,
+        )
+
+    assert registry._counters.shard_count() <= 1
+    body = registry.render().splitlines()
+    assert 'netpulse_requests_total{step="login",status="200"} 100' in body
+    assert "netpulse_active_users 0" in body